@@ -1,10 +1,23 @@
 # collect_all_product_urls.py
 
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
+from selectolax.lexbor import LexborHTMLParser
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from urllib.parse import quote_plus
+import asyncio
 import csv
+import hashlib
+import multiprocessing
+import os
+import pickle
+import re
+import tempfile
 import time
 
+import httpx
+from pybloom_live import ScalableBloomFilter
+
 # ---------------------------
 #  CONFIG
 # ---------------------------
@@ -36,17 +49,119 @@ QUERY_VARIANTS = {
     ],
 }
 
+# Brand is inferred from the product URL / anchor text, not the query
+BRAND_RE = re.compile(r"\b(" + "|".join(b.lower() for b in BRANDS) + r")\b", re.IGNORECASE)
+UNKNOWN_BRAND = "unknown"
+
 # Search templates
 AMAZON_SEARCH = "https://www.amazon.sg/s?k={query}"
 EBAY_SEARCH = "https://www.ebay.com/sch/i.html?_nkw={query}"
 LAZADA_SEARCH = "https://www.lazada.sg/catalog/?q={query}"
 CHALLENGER_SEARCH = "https://www.challenger.sg/search?q={query}"
 
+# Product anchor selectors, tried in order (first one that matches wins).
+# Built once here and shared by the HTTP and Playwright paths. The href
+# filters live in the selector so non-product anchors never reach Python.
+AMAZON_SELECTORS = ("a.a-link-normal.s-no-outline[href*='/dp/']", "a.a-link-normal[href*='/dp/']")
+EBAY_SELECTORS = ("a.s-item__link[href*='/itm/']", "a[href*='/itm/']")
+LAZADA_SELECTORS = ("a[href*='/products/']",)
+CHALLENGER_SELECTORS = ("a[href*='/products/'], a[href*='/product/']",)
+
+
+@dataclass(frozen=True)
+class Source:
+    name: str
+    template: str            # search URL, {query} = quoted keyword
+    selectors: tuple         # product anchors, first one that matches wins
+    domain: str              # prefix for relative hrefs
+    static: bool = False     # server-rendered → try plain HTTP before Chromium
+    page_param: str = ""     # result paging query param ("" → one page)
+    scroll_steps: int = 0    # lazy-loaded results → scroll instead of paging
+    scroll_pause: int = 350
+
+
+# Every source is scraped by the same collector, configured here
+SOURCES = [
+    Source("amazon", AMAZON_SEARCH, AMAZON_SELECTORS, "https://www.amazon.sg",
+           static=True, page_param="page"),
+    Source("ebay", EBAY_SEARCH, EBAY_SELECTORS, "https://www.ebay.com",
+           static=True, page_param="_pgn"),
+    Source("lazada", LAZADA_SEARCH, LAZADA_SELECTORS, "https://www.lazada.sg",
+           page_param="page"),
+    Source("challenger", CHALLENGER_SEARCH, CHALLENGER_SELECTORS, "https://www.challenger.sg",
+           scroll_steps=8),
+]
+
+# Every search URL the run can hit, built once: (source, keyword) → url
+SEARCH_URLS = {
+    (src.name, k): src.template.format(query=quote_plus(k))
+    for src in SOURCES
+    for variants in QUERY_VARIANTS.values()
+    for k in variants
+}
+
 OUTPUT_URL_CSV = "all_product_urls.csv"
+CSV_HEADER = ("URL", "Source", "Brand", "QueryType")
+
+# Cross-run dedup: (url, source) keys already written to OUTPUT_URL_CSV.
+# Saved with the CSV's byte size; if the CSV no longer has that size (kill
+# mid-batch, truncated / replaced file) the filter is rebuilt from the CSV.
+SEEN_BLOOM_PATH = "seen.bloom"
+BLOOM_CAPACITY = 100_000
+BLOOM_ERROR_RATE = 1e-4
 
 # Max per keyword per source
 MAX_PRODUCTS_PER_VARIANT_PER_SOURCE = 40
 
+# Result pages fetched side by side per search (instead of scrolling),
+# and roughly how many products one page lists
+SEARCH_PAGES = 3
+RESULTS_PER_PAGE = 40
+
+# Scrolled sources stop only after this many pauses in a row at the bottom
+# with no new content
+SCROLL_IDLE_PAUSES = 3
+
+# Browser pool: N Chromium instances, recycled after max pages / max age
+POOL_SIZE = int(os.environ.get("SCRAPER_POOLING_MAX_SIZE", 5))
+POOL_MAX_PAGES = int(os.environ.get("SCRAPER_POOLING_MAX_PAGES", 100))
+POOL_MAX_AGE_SECONDS = int(os.environ.get("SCRAPER_POOLING_MAX_AGE", 600))
+
+# Plain HTTP client for server-rendered search pages (Amazon / eBay)
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+# Seeing any of these → page is a bot wall, retry with the browser
+BOT_CHECK_MARKERS = (
+    "/errors/validatecaptcha",
+    "robot check",
+    "pardon our interruption",
+    "splashui/challenge",
+)
+
+# We only read anchor hrefs → never download these
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+
+# On-disk cache of search-result HTML, so re-runs skip the network
+# (SCRAPER_CACHE_TTL=0 turns it off)
+CACHE_DIR = ".cache"
+CACHE_TTL_SECONDS = int(os.environ.get("SCRAPER_CACHE_TTL", 6 * 3600))
+
+# Per-site cookies / localStorage carried over between runs
+STORAGE_STATE_PATH = "state_{source}.json"
+
+CHROMIUM_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--no-sandbox",
+    "--js-flags=--max-old-space-size=256",
+]
+
 # NEW: Only keep reliable sources
 ALLOWED_SOURCES = {"amazon", "ebay", "challenger", "lazada"}
 
@@ -56,211 +171,633 @@ TARGET_PER_CLASS = {
     "toner": 1000,
     "ink": 1000,
 }
+CLASS_FULL = "class_full"   # add_row() result once a class hit its target
 
 
 # ---------------------------
 #  UTILITIES
 # ---------------------------
 
-def safe_goto(page, url, timeout=20000):
+async def safe_goto(page, url, timeout=20000):
     print(f"  → GOTO {url}")
     try:
-        page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+        await page.goto(url, timeout=timeout, wait_until="domcontentloaded")
     except Exception:
         try:
-            page.goto(url, timeout=timeout, wait_until="load")
+            await page.goto(url, timeout=timeout, wait_until="load")
         except Exception:
             print("  ⚠ FAILED:", url)
 
 
-def scroll_down(page, steps=8, pause=400):
-    for _ in range(steps):
-        page.mouse.wheel(0, 2000)
-        page.wait_for_timeout(pause)
+def cache_path(url):
+    return os.path.join(CACHE_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html")
 
 
-# ---------------------------
-#  AMAZON
-# ---------------------------
+def cache_get(url):
+    path = cache_path(url)
+    try:
+        if time.time() - os.path.getmtime(path) > CACHE_TTL_SECONDS:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def cache_put(url, html):
+    if CACHE_TTL_SECONDS <= 0:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(url)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(html)
+    os.replace(tmp, path)
+
+
+# Runs in the browser: [href, text] for every anchor of the first selector
+# that matches, in one round-trip instead of one call per anchor
+ANCHORS_JS = """(selectors) => {
+    for (const sel of selectors) {
+        const anchors = document.querySelectorAll(sel);
+        if (anchors.length) {
+            return Array.from(anchors, a => [a.getAttribute("href"), a.innerText]);
+        }
+    }
+    return [];
+}"""
+
+
+async def wait_for_anchors(page, selectors, timeout=8000):
+    # returns as soon as the first product anchor is in the DOM
+    try:
+        await page.wait_for_selector(", ".join(selectors), state="attached", timeout=timeout)
+    except PlaywrightTimeoutError:
+        pass
+
+
+async def page_anchors(page, selectors):
+    return await page.evaluate(ANCHORS_JS, list(selectors))
+
+
+async def load_anchors(page, url, selectors, **scroll):
+    # cache hits never get here: run_collector parses them without a browser
+    await safe_goto(page, url)
+    await wait_for_anchors(page, selectors)
+    if scroll:
+        await scroll_down(page, selectors=selectors, **scroll)
+
+    anchors = await page_anchors(page, selectors)
+    if anchors:   # never cache an empty / blocked result
+        cache_put(url, await page.content())
+    return anchors
+
+
+def add_link(links, url, text):
+    # keep the first non-empty anchor text per URL (image links have none)
+    if not links.get(url):
+        links[url] = (text or "").strip()
+
+
+def brand_of(url, text):
+    m = BRAND_RE.search(url) or BRAND_RE.search(text)
+    if not m:
+        return UNKNOWN_BRAND
+    name = m.group(1).lower()
+    return next(b for b in BRANDS if b.lower() == name)
+
+
+# Runs in the browser: the whole scroll loop in one round-trip. Stops early
+# once max_products distinct product links are loaded, or the page bottom
+# is reached and the height stayed the same for idlePauses pauses in a row
+# (slow lazy-loading grids get more than one pause to append results).
+SCROLL_JS = """async ({steps, pause, delta, selectors, maxProducts, idlePauses}) => {
+    const loaded = () => {
+        const urls = new Set();
+        for (const sel of selectors) {
+            for (const a of document.querySelectorAll(sel)) {
+                urls.add((a.getAttribute("href") || "").split("?")[0]);
+            }
+            if (urls.size) break;
+        }
+        return urls.size;
+    };
+    let idle = 0;
+    for (let i = 0; i < steps; i++) {
+        if (maxProducts && loaded() >= maxProducts) return;
+        const height = document.body.scrollHeight;
+        window.scrollBy(0, delta);
+        await new Promise(r => setTimeout(r, pause));
+        const atBottom = window.scrollY + window.innerHeight >= document.body.scrollHeight - 1;
+        idle = atBottom && document.body.scrollHeight === height ? idle + 1 : 0;
+        if (idle >= idlePauses) return;
+    }
+}"""
+
+
+async def scroll_down(page, steps=8, pause=400, selectors=(), max_products=0):
+    await page.evaluate(SCROLL_JS, {
+        "steps": steps,
+        "pause": pause,
+        "delta": 2000,
+        "selectors": list(selectors),
+        "maxProducts": max_products,
+        "idlePauses": SCROLL_IDLE_PAUSES,
+    })
 
-def collect_amazon_urls(page, brand, keyword, max_products):
-    query = quote_plus(f"{brand} {keyword}")
-    url = AMAZON_SEARCH.format(query=query)
-    safe_goto(page, url)
-    page.wait_for_timeout(1200)
 
-    links = set()
-    anchors = page.query_selector_all("a.a-link-normal.s-no-outline") or \
-              page.query_selector_all("a.a-link-normal")
+async def block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
-    for a in anchors:
-        href = a.get_attribute("href")
-        if not href:
-            continue
-        if "/dp/" in href:
-            full = "https://www.amazon.sg" + href.split("?")[0]
-            links.add(full)
-        if len(links) >= max_products:
-            break
 
-    return list(links)
+# ---------------------------
+#  BROWSER POOL
+# ---------------------------
+
+async def save_storage_state(ctx, source):
+    # several workers / pool instances may save the same source at once →
+    # write to a unique temp file, then rename
+    path = STORAGE_STATE_PATH.format(source=source)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        await ctx.storage_state(path=tmp)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"  ⚠ could not save {path}:", e)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class BrowserPool:
+    def __init__(self, playwright, size=POOL_SIZE, max_pages=POOL_MAX_PAGES,
+                 max_age_seconds=POOL_MAX_AGE_SECONDS):
+        self.playwright = playwright
+        self.size = size
+        self.max_pages = max_pages
+        self.max_age_seconds = max_age_seconds
+        self.sem = asyncio.Semaphore(size)
+        self.idle = []
+
+    async def _create_instance(self):
+        browser = await self.playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+        return {
+            "browser": browser,
+            "contexts": {},   # source → BrowserContext, kept warm across keywords
+            "pages_processed": 0,
+            "created": time.monotonic(),
+        }
+
+    async def start(self):
+        self.idle = [await self._create_instance() for _ in range(self.size)]
+
+    def _expired(self, inst):
+        return (inst["pages_processed"] >= self.max_pages
+                or time.monotonic() - inst["created"] >= self.max_age_seconds)
+
+    async def _context(self, inst, source):
+        ctx = inst["contexts"].get(source)
+        if ctx is None:
+            # start from the cookies / storage the last run left for this site
+            path = STORAGE_STATE_PATH.format(source=source)
+            ctx = await inst["browser"].new_context(
+                storage_state=path if os.path.exists(path) else None
+            )
+            ctx.set_default_timeout(20000)
+            await ctx.route("**/*", block_heavy_resources)
+            inst["contexts"][source] = ctx
+        return ctx
+
+    @asynccontextmanager
+    async def acquire(self, source):
+        async with self.sem:
+            # prefer an instance that already has a warm context for this source
+            inst = next((i for i in self.idle if source in i["contexts"]), self.idle[-1])
+            self.idle.remove(inst)
+            try:
+                if self._expired(inst) or not inst["browser"].is_connected():
+                    await self._close_instance(inst)
+                    inst = await self._create_instance()
+
+                try:
+                    yield await self._context(inst, source)
+                finally:
+                    inst["pages_processed"] += 1
+            finally:
+                self.idle.append(inst)
+
+    async def _close_instance(self, inst):
+        for source, ctx in inst["contexts"].items():
+            await save_storage_state(ctx, source)
+        try:
+            await inst["browser"].close()
+        except Exception:
+            pass
+
+    async def close(self):
+        for inst in self.idle:
+            await self._close_instance(inst)
+        self.idle = []
 
 
 # ---------------------------
-#  EBAY
+#  STATIC HTML (no browser)
 # ---------------------------
 
-def collect_ebay_urls(page, brand, keyword, max_products):
-    query = quote_plus(f"{brand} {keyword}")
-    url = EBAY_SEARCH.format(query=query)
-    safe_goto(page, url)
+async def fetch_static(client, url):
+    # (html, from_network); html None → fall back to the Playwright path.
+    # Nothing is cached here: only pages that yield product links are (see
+    # collect_urls_static), so an empty page can't shadow the browser path.
+    html = cache_get(url)
+    if html is not None:
+        print(f"  → CACHE {url}")
+        return html, False
 
+    print(f"  → GET {url}")
     try:
-        page.wait_for_load_state("networkidle")
-    except:
-        page.wait_for_timeout(1500)
-
-    links = set()
-    anchors = page.query_selector_all("a.s-item__link") or \
-              page.query_selector_all("a[href*='/itm/']")
-
-    for a in anchors:
-        href = a.get_attribute("href")
-        if href and "/itm/" in href:
-            links.add(href.split("?")[0])
-        if len(links) >= max_products:
-            break
+        r = await client.get(url)
+    except httpx.HTTPError as e:
+        print("  ⚠ FAILED:", url, e)
+        return None, True
 
-    return list(links)
+    if r.status_code != 200:
+        print(f"  ⚠ HTTP {r.status_code}:", url)
+        return None, True
 
+    low = r.text.lower()
+    if any(m in low for m in BOT_CHECK_MARKERS):
+        print("  ⚠ bot check:", url)
+        return None, True
 
-# ---------------------------
-#  LAZADA
-# ---------------------------
+    return r.text, True
 
-def collect_lazada_urls(page, brand, keyword, max_products):
-    query = quote_plus(f"{brand} {keyword}")
-    url = LAZADA_SEARCH.format(query=query)
-    safe_goto(page, url)
-    page.wait_for_timeout(2000)
 
-    scroll_down(page, steps=10, pause=350)
+def paged_url(url, param, n):
+    # every search template already has a query string
+    return url if n == 1 else f"{url}&{param}={n}"
 
-    anchors = page.query_selector_all("a[href*='/products/']")
-    links = set()
 
-    for a in anchors:
-        href = a.get_attribute("href")
-        if not href:
-            continue
-        if href.startswith("//"):
-            href = "https:" + href
-        elif href.startswith("/"):
-            href = "https://www.lazada.sg" + href
+def pages_for(max_products):
+    return max(1, min(SEARCH_PAGES, -(-max_products // RESULTS_PER_PAGE)))
 
-        links.add(href.split("?")[0])
-        if len(links) >= max_products:
-            break
 
-    return list(links)
+def result_page_urls(src, url, max_products):
+    if not src.page_param:
+        return [url]
+    return [paged_url(url, src.page_param, n) for n in range(1, pages_for(max_products) + 1)]
+
+
+async def fetch_static_pages(client, urls):
+    # [(url, html, from_network)]; page 1 decides: failed / blocked → None
+    # (Playwright fallback)
+    pages = await asyncio.gather(*(fetch_static(client, u) for u in urls))
+    if pages[0][0] is None:
+        return None
+    return [(u, html, fetched) for u, (html, fetched) in zip(urls, pages) if html is not None]
+
+
+def static_anchors(html, selectors):
+    # same "first selector that matches wins" rule as the Playwright path
+    tree = LexborHTMLParser(html)
+    for sel in selectors:
+        nodes = tree.css(sel)
+        if nodes:
+            return [(n.attributes.get("href"), n.text()) for n in nodes]
+    return []
 
 
 # ---------------------------
-#  CHALLENGER
+#  COLLECTORS (one generic pair, driven by SOURCES)
 # ---------------------------
 
-def collect_challenger_urls(page, brand, keyword, max_products):
-    query = quote_plus(f"{brand} {keyword}")
-    url = CHALLENGER_SEARCH.format(query=query)
-    safe_goto(page, url)
-    page.wait_for_timeout(2500)
-
-    scroll_down(page, steps=8, pause=350)
+def absolute_url(href, domain):
+    if href.startswith("//"):
+        return "https:" + href
+    if href.startswith("/"):
+        return domain + href
+    return href
 
-    anchors = page.query_selector_all("a[href*='/products/'], a[href*='/product/']")
-    links = set()
 
-    for a in anchors:
-        href = a.get_attribute("href")
-        if not href:
-            continue
-        if href.startswith("/"):
-            href = "https://www.challenger.sg" + href
-        links.add(href.split("?")[0])
+def source_links(src, anchors, max_products):
+    links = {}
+    for href, text in anchors:
+        add_link(links, absolute_url(href, src.domain).partition("?")[0], text)
         if len(links) >= max_products:
             break
 
-    return list(links)
+    return list(links.items())
+
+
+async def collect_urls_static(client, src, url, max_products):
+    pages = await fetch_static_pages(client, result_page_urls(src, url, max_products))
+    if pages is None:
+        return None
+
+    anchors = []
+    for page_url, html, fetched in pages:
+        found = static_anchors(html, src.selectors)
+        if found and fetched:   # same rule as load_anchors: never cache an empty result
+            cache_put(page_url, html)
+        anchors.extend(found)
+    return source_links(src, anchors, max_products) or None
+
+
+def browser_page_urls(src, url, max_products):
+    # scroll sources load everything from one page
+    return [url] if src.scroll_steps else result_page_urls(src, url, max_products)
+
+
+def cached_links(src, url, max_products):
+    # rendered HTML saved by an earlier browser run; page 1 decides like
+    # fetch_static_pages: not cached → None (load it in the browser)
+    urls = browser_page_urls(src, url, max_products)
+    pages = [(u, cache_get(u)) for u in urls]
+    if pages[0][1] is None:
+        return None
+
+    print(f"  → CACHE {url}")
+    anchors = []
+    for _, html in pages:
+        if html is not None:
+            anchors.extend(static_anchors(html, src.selectors))
+    return source_links(src, anchors, max_products) or None
+
+
+async def collect_urls(page, src, url, max_products):
+    if src.scroll_steps:
+        anchors = await load_anchors(page, url, src.selectors, steps=src.scroll_steps,
+                                     pause=src.scroll_pause, max_products=max_products)
+        return source_links(src, anchors, max_products)
+
+    # result pages 2..K load in extra tabs of the same context, in parallel
+    first, *rest = result_page_urls(src, url, max_products)
+    extra = [await page.context.new_page() for _ in rest]
+    try:
+        results = await asyncio.gather(
+            load_anchors(page, first, src.selectors),
+            *(load_anchors(tab, u, src.selectors) for tab, u in zip(extra, rest)),
+            return_exceptions=True,
+        )
+    finally:
+        for tab in extra:
+            await tab.close()
+
+    if isinstance(results[0], Exception):
+        raise results[0]
+    anchors = [a for r in results if not isinstance(r, Exception) for a in r]
+    return source_links(src, anchors, max_products)
 
 
 # ---------------------------
 #  MAIN SCRAPER
 # ---------------------------
 
-def main():
+async def run_collector(pool, client, src, url, cap):
+    # server-rendered sources skip the browser unless blocked / empty
+    if src.static:
+        links = await collect_urls_static(client, src, url, cap)
+        if links is not None:
+            return links
+
+    # cached rendered pages → parse them here, no browser slot / page at all
+    links = cached_links(src, url, cap)
+    if links is not None:
+        return links
+
+    # fresh page per call (a crash stays isolated) on the source's warm context
+    async with pool.acquire(src.name) as ctx:
+        page = await ctx.new_page()
+        try:
+            return await collect_urls(page, src, url, cap)
+        finally:
+            await page.close()
+
+
+async def collect_keyword(pool, client, qtype, keyword, cap):
+    print(f"\n🔍 [{qtype}] keyword = {keyword}")
+
+    # all sources side by side for this keyword
+    tasks = [
+        asyncio.create_task(
+            run_collector(pool, client, src, SEARCH_URLS[(src.name, keyword)], cap)
+        )
+        for src in SOURCES
+    ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+
     rows = []
-    seen = set()
+    for src, links in zip(SOURCES, results):
+        if isinstance(links, Exception):
+            print(f"  ⚠ {src.name} failed:", links)
+            continue
+        for url, text in links:
+            rows.append((url, src.name, brand_of(url, text), qtype))
 
-    # New counters for balanced dataset
-    class_counts = {k: 0 for k in TARGET_PER_CLASS}
+    return rows
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.set_default_timeout(20000)
 
-        for brand in BRANDS:
-            print("\n==============================")
-            print(f"      BRAND: {brand}")
-            print("==============================\n")
+# ---------------------------
+#  WORKERS (one process per query type)
+# ---------------------------
 
-            for qtype in QUERY_TYPES:
-                print(f"--- QUERY TYPE: {qtype.upper()} ---")
-                variants = QUERY_VARIANTS[qtype]
+# Each query type has its own class counter, so the types are scraped in
+# parallel processes, each with its own Playwright + Chromium pool.
+WORKER_PROCESSES = len(QUERY_TYPES)
+WORKER_POOL_SIZE = max(1, -(-POOL_SIZE // WORKER_PROCESSES))
 
-                for keyword in variants:
+_results = None    # multiprocessing.Queue back to the parent, set per worker
+_accepted = None   # qtype → multiprocessing.Value: rows the parent actually wrote
 
-                    # stop early if full dataset collected
-                    if all(class_counts[t] >= TARGET_PER_CLASS[t] for t in TARGET_PER_CLASS):
-                        print("\n🎉 Reached target dataset size — stopping early.")
-                        browser.close()
-                        return save_csv(rows)
 
-                    print(f"\n🔍 keyword = {keyword}")
-                    cap = MAX_PRODUCTS_PER_VARIANT_PER_SOURCE
+def init_worker(results, accepted):
+    global _results, _accepted
+    _results = results
+    _accepted = accepted
 
-                    # AMAZON
-                    for url in collect_amazon_urls(page, brand, keyword, cap):
-                        if add_row(url, "amazon", brand, qtype, rows, seen, class_counts):
-                            pass
 
-                    # EBAY
-                    for url in collect_ebay_urls(page, brand, keyword, cap):
-                        if add_row(url, "ebay", brand, qtype, rows, seen, class_counts):
-                            pass
+def scrape_query_type(job):
+    qtype, seen = job
+    try:
+        asyncio.run(collect_query_type(qtype, seen))
+    finally:
+        _results.put(None)   # this worker is done
+    return qtype
+
+
+async def collect_query_type(qtype, seen):
+    # Each keyword is queried once for all brands; the brand is read
+    # back from the product URL / title instead of the search query.
+    async with async_playwright() as p, \
+            httpx.AsyncClient(http2=True, headers=HTTP_HEADERS, timeout=20,
+                              follow_redirects=True) as client:
+        pool = BrowserPool(p, size=WORKER_POOL_SIZE)
+        await pool.start()
+        try:
+            for keyword in QUERY_VARIANTS[qtype]:
 
-                    # LAZADA
-                    for url in collect_lazada_urls(page, brand, keyword, cap):
-                        if add_row(url, "lazada", brand, qtype, rows, seen, class_counts):
-                            pass
+                # stop early if this class is full. Counted by the parent after
+                # its cross-worker dedup, so rows it drops don't use up quota
+                # (it may lag a keyword behind → over-fetch, never under-fill)
+                remaining = TARGET_PER_CLASS[qtype] - _accepted[qtype].value
+                if remaining <= 0:
+                    print(f"\n🎉 [{qtype}] Reached target size — stopping early.")
+                    break
 
-                    # CHALLENGER
-                    for url in collect_challenger_urls(page, brand, keyword, cap):
-                        if add_row(url, "challenger", brand, qtype, rows, seen, class_counts):
-                            pass
+                # no source needs more links than the class still has room for
+                cap = min(MAX_PRODUCTS_PER_VARIANT_PER_SOURCE * len(BRANDS), remaining)
 
-                    time.sleep(0.7)
+                new_rows = []
+                for row in await collect_keyword(pool, client, qtype, keyword, cap):
+                    if len(new_rows) >= remaining:
+                        break
+                    key = (row[0], row[1])
+                    if key not in seen:
+                        seen.add(key)
+                        new_rows.append(row)
 
-        browser.close()
+                _results.put(new_rows)
+        finally:
+            await pool.close()
 
-    save_csv(rows)
+
+def main():
+    # New counters for balanced dataset (resumed from an earlier run's CSV)
+    seen, class_counts = load_checkpoint()
+    added = 0
+
+    with open(OUTPUT_URL_CSV, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(CSV_HEADER)
+
+        results = multiprocessing.Queue()
+        accepted = {q: multiprocessing.Value("i", class_counts[q]) for q in QUERY_TYPES}
+        jobs = [(qtype, seen) for qtype in QUERY_TYPES]
+
+        with multiprocessing.Pool(WORKER_PROCESSES, initializer=init_worker,
+                                  initargs=(results, accepted)) as procs:
+            pending = procs.map_async(scrape_query_type, jobs)
+
+            # final dedup across workers happens here, in one place
+            running = len(jobs)
+            try:
+                while running:
+                    rows = results.get()
+                    if rows is None:
+                        running -= 1
+                        continue
+                    for row in rows:
+                        status = add_row(*row, writer, seen, class_counts)
+                        if status == CLASS_FULL:
+                            break
+                        if status:
+                            added += 1
+
+                    # workers size their next keyword from what was accepted
+                    for q in QUERY_TYPES:
+                        accepted[q].value = class_counts[q]
+
+                    # rows are on disk after every keyword → a killed run keeps them
+                    f.flush()
+                    seen.save(SEEN_BLOOM_PATH, OUTPUT_URL_CSV)
+            finally:
+                f.flush()
+                seen.save(SEEN_BLOOM_PATH, OUTPUT_URL_CSV)
+
+            pending.get()   # re-raise a worker's exception, if any
+
+    total = sum(class_counts.values())
+    print(f"\n✅ SAVED {added} new URLs → {OUTPUT_URL_CSV} ({total} total)")
 
 
 # ---------------------------
 #  HELPERS
 # ---------------------------
 
-def add_row(url, source, brand, qtype, rows, seen, class_counts):
+class SeenUrls:
+    # exact set for this run, Bloom filter for everything from earlier runs
+    def __init__(self, bloom=None):
+        # `is None`, not `or`: an empty filter has len 0 and is falsy, and a
+        # checkpointed one must be kept as-is
+        if bloom is None:
+            bloom = ScalableBloomFilter(
+                initial_capacity=BLOOM_CAPACITY, error_rate=BLOOM_ERROR_RATE
+            )
+        self.bloom = bloom
+        self.run = set()
+
+    @staticmethod
+    def _bloom_key(key):
+        url, source = key
+        return f"{source} {url}"
+
+    def __contains__(self, key):
+        return key in self.run or self._bloom_key(key) in self.bloom
+
+    def add(self, key):
+        self.run.add(key)
+        self.bloom.add(self._bloom_key(key))
+
+    @classmethod
+    def load(cls, path):
+        # → (SeenUrls, CSV size it was saved against); (None, None) for an
+        # older checkpoint that didn't record the size
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if not isinstance(data, dict):
+            return None, None
+        return cls(data["bloom"]), data["csv_size"]
+
+    def save(self, path, csv_path):
+        # csv_path must be flushed first, so its size matches this filter
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"bloom": self.bloom, "csv_size": os.path.getsize(csv_path)}, f)
+        os.replace(tmp, path)
+
+
+def load_checkpoint():
+    class_counts = {k: 0 for k in TARGET_PER_CLASS}
+
+    # the filter only means something next to the CSV it was built from
+    if not os.path.exists(OUTPUT_URL_CSV):
+        return SeenUrls(), class_counts
+
+    seen, csv_size = None, None
+    if os.path.exists(SEEN_BLOOM_PATH):
+        seen, csv_size = SeenUrls.load(SEEN_BLOOM_PATH)
+
+    have_bloom = seen is not None and csv_size == os.path.getsize(OUTPUT_URL_CSV)
+    if not have_bloom:
+        if os.path.exists(SEEN_BLOOM_PATH):
+            print(f"⚠ {SEEN_BLOOM_PATH} out of sync with {OUTPUT_URL_CSV} → rebuilding it")
+        seen = SeenUrls()
+
+    with open(OUTPUT_URL_CSV, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            if len(row) < len(CSV_HEADER):
+                continue
+            url, source, _, qtype = row[:4]
+            if not have_bloom:
+                seen.bloom.add(SeenUrls._bloom_key((url, source)))
+            if qtype in class_counts:
+                class_counts[qtype] += 1
+
+    total = sum(class_counts.values())
+    print(f"↻ Resuming: {total} URLs already in {OUTPUT_URL_CSV}")
+    return seen, class_counts
+
+
+def add_row(url, source, brand, qtype, writer, seen, class_counts):
+    # True → written, False → duplicate, CLASS_FULL → stop adding this class
+    if class_counts[qtype] >= TARGET_PER_CLASS[qtype]:
+        return CLASS_FULL
+
     key = (url, source)
     if key in seen:
         return False
@@ -268,26 +805,11 @@ def add_row(url, source, brand, qtype, rows, seen, class_counts):
     seen.add(key)
     class_counts[qtype] += 1
 
-    rows.append({
-        "URL": url,
-        "Source": source,
-        "Brand": brand,
-        "QueryType": qtype,
-    })
+    # same column order as CSV_HEADER
+    writer.writerow((url, source, brand, qtype))
 
     return True
 
 
-def save_csv(rows):
-    with open(OUTPUT_URL_CSV, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f, fieldnames=["URL", "Source", "Brand", "QueryType"]
-        )
-        writer.writeheader()
-        writer.writerows(rows)
-
-    print(f"\n✅ SAVED {len(rows)} URLs → {OUTPUT_URL_CSV}")
-
-
 if __name__ == "__main__":
     main()
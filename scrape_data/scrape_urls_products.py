@@ -1,20 +1,137 @@
 # scrape_urls_products.py
 
+import asyncio
+import atexit
 import csv
-import time
-from urllib.parse import urlparse
-
-from bs4 import BeautifulSoup
-from playwright.sync_api import sync_playwright
+import json
+import logging
+import logging.handlers
+import os
+import random
+import re
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache, partial
+from html import unescape
+from itertools import chain
+from queue import SimpleQueue
+
+import httpx
+from playwright.async_api import async_playwright
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+from selectolax.lexbor import LexborHTMLParser
+
+# Progress goes through a QueueHandler; a listener thread does the stdout writes
+LOG = logging.getLogger("scrape")
 
 INPUT_URL_CSV = "all_product_urls.csv"
 OUTPUT_CSV = "products_other_visual_dataset.csv"
+# Rows land here as they are scraped; OUTPUT_CSV is exported from it at the end.
+# Kept across runs → URLs already in it are skipped on restart.
+OUTPUT_DB = "products.db"
+
+# Product pages scraped at the same time
+CONCURRENCY = 20
+# Input rows read ahead of the workers (the CSV is streamed, not loaded)
+QUEUE_SIZE = 100
+# One warm context per host family; recycled after this many pages to cap memory
+CONTEXT_HOSTS = ("amazon", "lazada", "ebay", "other")
+CONTEXT_MAX_PAGES = 200
+# Random delay before each URL so workers don't hit a site in lockstep
+JITTER_SECONDS = 0.3
+
+OUTPUT_FIELDS = [
+    "URL", "Source", "Brand", "Product_ID",
+    "Product_Title", "Product_Type",
+    "Image_URL_1", "Image_URL_2",
+    "Image_URL_3", "Image_URL_4",
+]
+# Rows are committed to OUTPUT_DB in batches of N
+COMMIT_EVERY = 64
+
+# URL is the key; (Source, Brand, Product_Title) replaces the in-memory seen set
+PRODUCTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    URL TEXT PRIMARY KEY,
+    Source TEXT, Brand TEXT, Product_ID TEXT,
+    Product_Title TEXT, Product_Type TEXT,
+    Image_URL_1 TEXT, Image_URL_2 TEXT,
+    Image_URL_3 TEXT, Image_URL_4 TEXT,
+    UNIQUE (Source, Brand, Product_Title)
+)
+"""
+INSERT_PRODUCT = (
+    f"INSERT OR IGNORE INTO products ({', '.join(OUTPUT_FIELDS)}) "
+    f"VALUES ({', '.join('?' * len(OUTPUT_FIELDS))})"
+)
+
+# Keep-alive HTTP client for the no-browser fast path
+HTTP_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept-Language": "en-US,en;q=0.9",
+}
+# Amazon's mobile product page serves title + images as plain HTML
+MOBILE_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 "
+        "(KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1"
+    ),
+}
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+
+# Static-path HTML is parsed in worker processes so the event loop keeps fetching
+# (the ProcessPoolExecutor is created in main, not at import)
+PARSE_WORKERS = os.cpu_count() or 4
+
+# Only HTML + meta tags are parsed; image URLs come from the DOM, not the pixels
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com",
+    "doubleclick.net", "facebook.net",
+)
+
+CHROMIUM_ARGS = [
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--no-sandbox",
+]
 
 
 # ----------------- Helpers ----------------- #
 
+def start_logging():
+    log_queue = SimpleQueue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    LOG.addHandler(logging.handlers.QueueHandler(log_queue))
+    LOG.setLevel(logging.INFO)
+    LOG.propagate = False
+    return listener
+
+
+# netloc of an http(s) URL, without going through urlparse
+HOST_RE = re.compile(r"^https?://([^/?#]+)", re.I)
+
+
+def host_of(url: str) -> str:
+    m = HOST_RE.match(url)
+    return m.group(1) if m else ""
+
+
 def domain_of(url: str) -> str:
-    host = urlparse(url).netloc.lower()
+    return host_domain(host_of(url).lower())
+
+
+# keyed on the host, not the URL: input URLs are unique but hosts repeat
+@lru_cache(maxsize=1024)
+def host_domain(host: str) -> str:
     if "amazon." in host:
         return "amazon"
     if "lazada." in host:
@@ -24,130 +141,278 @@ def domain_of(url: str) -> str:
     return "other"
 
 
-def safe_goto(page, url: str, timeout: int = 25000):
+@lru_cache(maxsize=1024)
+def is_blocked_host(host: str) -> bool:
+    # exact host or a subdomain of it; userinfo / port are not part of the name
+    name = host.rpartition("@")[2].partition(":")[0].lower()
+    return any(name == h or name.endswith("." + h) for h in BLOCKED_HOSTS)
+
+
+async def safe_goto(page, url: str, timeout: int = 25000):
     try:
-        page.goto(url, timeout=timeout, wait_until="domcontentloaded")
+        await page.goto(url, timeout=timeout, wait_until="domcontentloaded")
     except Exception:
         try:
-            page.goto(url, timeout=timeout, wait_until="load")
+            await page.goto(url, timeout=timeout, wait_until="load")
         except Exception as e:
-            print(f"   [ERROR] failed to load {url}: {e}")
+            LOG.warning("   [ERROR] failed to load %s: %s", url, e)
+
+
+async def wait_for(page, selector, timeout):
+    # returns as soon as the element we parse is in the DOM
+    try:
+        await page.wait_for_selector(selector, timeout=timeout, state="attached")
+    except PlaywrightTimeoutError:
+        pass
+
+
+async def block_heavy_resources(route):
+    req = route.request
+    if (req.resource_type in BLOCKED_RESOURCE_TYPES
+            or is_blocked_host(host_of(req.url))):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+# Browser path: pull just the fields we need with one page.evaluate
+# instead of shipping the whole DOM back through page.content()
+PAGE_JS_HELPERS = """
+const meta = s => (document.querySelector(s)?.getAttribute('content') || '').trim();
+const text = sel => (document.querySelector(sel)?.textContent || '').trim();
+const srcs = () => Array.from(document.querySelectorAll('img'), i => i.getAttribute('src') || '');
+"""
+
+
+def page_js(body):
+    # `sel` (CSS selectors) and `opts` (limits etc.) are passed in by evaluate_page
+    return "({sel, opts}) => {" + PAGE_JS_HELPERS + body + "}"
+
+
+async def evaluate_page(page, js, selectors=None, opts=None):
+    # og:* selectors come from OG_SELECTORS, same table as the static parse
+    return await page.evaluate(js, {
+        "sel": {**OG_SELECTORS, **(selectors or {})},
+        "opts": opts or {},
+    })
+
+
+def extracted_result(data):
+    # {title, ogImage, imgs} from a site extractor → (title, padded imgs)
+    imgs = data["imgs"]
+    if data["ogImage"]:
+        imgs.insert(0, data["ogImage"])
+    return data["title"], pad_images(imgs)
+
+
+async def fetch_static(client, url, headers=None):
+    # plain GET, no browser; returns the HTML, None → use the Playwright path
+    try:
+        r = await client.get(url, headers=headers)
+    except httpx.HTTPError:
+        return None
+    if r.status_code != 200:
+        return None
+    return r.text
+
+
+def parse_html(parser, html):
+    # runs in the parse pool; parser is one of the parse_* functions
+    return parser(LexborHTMLParser(html))
 
 
-def soup_from_page(page):
-    return BeautifulSoup(page.content(), "lxml")
+async def parse_in_pool(parse_pool, parser, html):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(parse_pool, parse_html, parser, html)
 
 
-def get_og_title_and_image(soup):
+# Selector strings live at module level so each parse doesn't rebuild them
+# (lexbor has no compiled-selector object to cache)
+OG_SELECTORS = {
+    "og_title": 'meta[property="og:title"]',
+    "og_image": 'meta[property="og:image"]',
+}
+
+
+def get_og_title_and_image(tree):
     title = ""
     img = ""
 
-    og_title = soup.find("meta", property="og:title")
-    if og_title and og_title.get("content"):
-        title = og_title["content"].strip()
+    og_title = tree.css_first(OG_SELECTORS["og_title"])
+    if og_title and og_title.attributes.get("content"):
+        title = og_title.attributes["content"].strip()
 
-    og_image = soup.find("meta", property="og:image")
-    if og_image and og_image.get("content"):
-        img = og_image["content"].strip()
+    og_image = tree.css_first(OG_SELECTORS["og_image"])
+    if og_image and og_image.attributes.get("content"):
+        img = og_image.attributes["content"].strip()
 
     return title, img
 
 
+def page_title(tree):
+    el = tree.css_first("title")
+    return el.text(strip=True) if el else ""
+
+
 def pad_images(imgs, max_n=4):
-    imgs = [i for i in imgs if i]
-    imgs = imgs[:max_n]
-    while len(imgs) < max_n:
-        imgs.append("")
-    return imgs
+    # first max_n unique non-empty URLs, padded with ""
+    out, seen = [], set()
+    for i in imgs:
+        if i and i not in seen:
+            seen.add(i)
+            out.append(i)
+            if len(out) == max_n:
+                break
+    out.extend([""] * (max_n - len(out)))
+    return out
+
+
+PRINTER_KEYWORDS = [
+    "printer", "laserjet", "inkjet", "multifunction",
+    "all-in-one", "mfp"
+]
+
+TONER_KEYWORDS = [
+    "toner", "drum unit", "laser cartridge",
+    "toner cartridge"
+]
 
+INK_KEYWORDS = [
+    "ink", "ink bottle", "ink tank",
+    "ink cartridge"
+]
 
+# one compiled alternation per class, checked in priority order
+PRODUCT_TYPE_PATTERNS = [
+    (product_type, re.compile("|".join(map(re.escape, keywords))))
+    for product_type, keywords in (
+        ("Printer", PRINTER_KEYWORDS),
+        ("Toner", TONER_KEYWORDS),
+        ("Ink", INK_KEYWORDS),
+    )
+]
+
+
+@lru_cache(maxsize=8192)
 def classify_product_type(title: str) -> str:
     if not title:
         return "Other"
 
     t = title.lower()
 
-    printer_keywords = [
-        "printer", "laserjet", "inkjet", "multifunction",
-        "all-in-one", "mfp"
-    ]
-
-    toner_keywords = [
-        "toner", "drum unit", "laser cartridge",
-        "toner cartridge"
-    ]
-
-    ink_keywords = [
-        "ink", "ink bottle", "ink tank",
-        "ink cartridge"
-    ]
-
-    if any(k in t for k in printer_keywords):
-        return "Printer"
-    if any(k in t for k in toner_keywords):
-        return "Toner"
-    if any(k in t for k in ink_keywords):
-        return "Ink"
+    for product_type, pattern in PRODUCT_TYPE_PATTERNS:
+        if pattern.search(t):
+            return product_type
 
     return "Other"
 
 
 # ----------------- AMAZON ----------------- #
 
-def scrape_amazon(page, url):
-    safe_goto(page, url, timeout=30000)
-    # shorter sleep, rely mostly on DOMContentLoaded
-    page.wait_for_timeout(1200)
-    soup = soup_from_page(page)
+AMAZON_SELECTORS = {
+    "title": "#productTitle",
+    "image": "img#landingImage",
+}
+
 
-    title, og_img = get_og_title_and_image(soup)
+def parse_amazon(tree):
+    title, og_img = get_og_title_and_image(tree)
 
     if not title:
-        el = soup.select_one("#productTitle")
+        el = tree.css_first(AMAZON_SELECTORS["title"])
         if el:
-            title = el.get_text(strip=True)
+            title = el.text(strip=True)
+
+    main = tree.css_first(AMAZON_SELECTORS["image"])
+    attrs = main.attributes if main else {}
+    imgs = amazon_images(attrs.get("src"), attrs.get("data-a-dynamic-image"), og_img)
+
+    return title, pad_images(imgs)
 
+
+def amazon_images(main_src, dyn, og_img):
     imgs = []
-    main = soup.select_one("img#landingImage")
-    if main:
-        src = main.get("src") or ""
-        if src:
-            imgs.append(src)
+    if main_src:
+        imgs.append(main_src)
 
-    if main and main.get("data-a-dynamic-image"):
-        import json
+    # {url: [w, h], ...} for every size of the landing image
+    if dyn:
         try:
-            js = json.loads(main["data-a-dynamic-image"])
-            for k in js.keys():
-                imgs.append(k)
-        except Exception:
-            pass
+            sizes = json.loads(dyn)
+        except ValueError:
+            sizes = None
+        if isinstance(sizes, dict):   # anything else → just skip it
+            imgs.extend(sizes)
 
     if og_img and og_img not in imgs:
         imgs.append(og_img)
 
-    return title, pad_images(imgs)
+    return imgs
+
+
+AMAZON_JS = page_js("""
+const main = document.querySelector(sel.image);
+return {
+  title: meta(sel.og_title) || text(sel.title),
+  ogImage: meta(sel.og_image),
+  mainSrc: main?.getAttribute('src') || '',
+  dyn: main?.getAttribute('data-a-dynamic-image') || '',
+};
+""")
+
+
+ASIN_RE = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})")
+
+
+def amazon_static_request(url):
+    # known ASIN → mobile page on the same storefront, else the URL as given
+    m = ASIN_RE.search(url)
+    if not m:
+        return url, None
+    return f"https://{host_of(url)}/gp/aw/d/{m.group(1)}", MOBILE_HEADERS
+
+
+async def scrape_amazon(open_page, client, parse_pool, url):
+    static_url, headers = amazon_static_request(url)
+    html = await fetch_static(client, static_url, headers)
+    if html is not None:
+        title, imgs = await parse_in_pool(parse_pool, parse_amazon, html)
+        if title and any(imgs):
+            return title, imgs
+
+    async with open_page() as page:
+        await safe_goto(page, url, timeout=30000)
+        await wait_for(page, "img#landingImage, #productTitle", 4000)
+        data = await evaluate_page(page, AMAZON_JS, AMAZON_SELECTORS)
+    return data["title"], pad_images(
+        amazon_images(data["mainSrc"], data["dyn"], data["ogImage"])
+    )
 
 
 # ----------------- LAZADA ----------------- #
 
-def scrape_lazada(page, url):
-    safe_goto(page, url, timeout=30000)
-    page.wait_for_timeout(1800)
-    soup = soup_from_page(page)
+# CDN match done by the selector engine; only sprite/logo filtering is left to us
+LAZADA_SELECTORS = {
+    "images": 'img[src*="slatic.net" i], img[src*="lazada" i]',
+}
+# pad_images keeps 4; a few spare in case the og image repeats
+LAZADA_MAX_IMAGES = 8
 
-    title, og_img = get_og_title_and_image(soup)
-    if not title and soup.title:
-        title = soup.title.string.strip()
+
+def parse_lazada(tree):
+    title, og_img = get_og_title_and_image(tree)
+    if not title:
+        title = page_title(tree)
 
     imgs = []
-    for img in soup.find_all("img"):
-        src = img.get("src") or ""
+    for img in tree.css(LAZADA_SELECTORS["images"]):
+        src = img.attributes["src"]
         low = src.lower()
-        if "slatic.net" in low or "lazada" in low:
-            if "sprite" in low or "logo" in low:
-                continue
-            imgs.append(src)
+        if "sprite" in low or "logo" in low or src in imgs:
+            continue
+        imgs.append(src)
+        if len(imgs) >= LAZADA_MAX_IMAGES:
+            break
 
     if og_img:
         imgs.insert(0, og_img)
@@ -155,62 +420,107 @@ def scrape_lazada(page, url):
     return title, pad_images(imgs)
 
 
+LAZADA_JS = page_js("""
+const imgs = [];
+for (const img of document.querySelectorAll(sel.images)) {
+  const s = img.getAttribute('src');
+  const low = s.toLowerCase();
+  if (low.includes('sprite') || low.includes('logo') || imgs.includes(s)) continue;
+  imgs.push(s);
+  if (imgs.length >= opts.maxImages) break;
+}
+return {title: meta(sel.og_title) || text('title'), ogImage: meta(sel.og_image), imgs};
+""")
+
+
+async def scrape_lazada(open_page, url):
+    async with open_page() as page:
+        await safe_goto(page, url, timeout=30000)
+        await wait_for(page, OG_SELECTORS["og_image"], 4000)
+        data = await evaluate_page(page, LAZADA_JS, LAZADA_SELECTORS,
+                                   opts={"maxImages": LAZADA_MAX_IMAGES})
+        return extracted_result(data)
+
+
 # ----------------- EBAY ----------------- #
 
-def scrape_ebay(page, url):
-    safe_goto(page, url, timeout=30000)
-    page.wait_for_timeout(1200)
-    soup = soup_from_page(page)
+EBAY_SELECTORS = {
+    "titles": [
+        "h1.x-item-title__mainTitle span.ux-textspans--BOLD",
+        "h1.x-item-title__mainTitle",
+        "h1[itemprop='name']",
+        "h1",
+    ],
+    "active_image": "div.ux-image-carousel-item.active img",
+}
+
 
-    title, og_img = get_og_title_and_image(soup)
+def parse_ebay(tree):
+    title, og_img = get_og_title_and_image(tree)
 
     if not title:
-        selectors = [
-            "h1.x-item-title__mainTitle span.ux-textspans--BOLD",
-            "h1.x-item-title__mainTitle",
-            "h1[itemprop='name']",
-            "h1",
-        ]
-        for sel in selectors:
-            el = soup.select_one(sel)
-            if el and el.get_text(strip=True):
-                title = el.get_text(strip=True)
+        for sel in EBAY_SELECTORS["titles"]:
+            el = tree.css_first(sel)
+            if el and (text := el.text(strip=True)):
+                title = text
                 break
 
     imgs = []
 
-    active = soup.select_one("div.ux-image-carousel-item.active img")
-    if active and active.get("src"):
-        imgs.append(active["src"])
+    active = tree.css_first(EBAY_SELECTORS["active_image"])
+    if active and active.attributes.get("src"):
+        imgs.append(active.attributes["src"])
 
-    for img in soup.find_all("img"):
-        src = img.get("src") or ""
+    for img in tree.css("img"):
+        src = img.attributes.get("src") or ""
         if "i.ebayimg.com" in src:
             imgs.append(src)
 
     if og_img:
         imgs.insert(0, og_img)
 
-    imgs = list(dict.fromkeys(imgs))  # dedupe
-
     return title, pad_images(imgs)
 
 
-# ----------------- GENERIC ----------------- #
+EBAY_JS = page_js("""
+let title = meta(sel.og_title);
+if (!title) {
+  for (const s of sel.titles) {
+    title = text(s);
+    if (title) break;
+  }
+}
+const imgs = srcs().filter(s => s.includes('i.ebayimg.com'));
+const active = document.querySelector(sel.active_image)?.getAttribute('src');
+if (active) imgs.unshift(active);
+return {title, ogImage: meta(sel.og_image), imgs};
+""")
+
 
-def scrape_generic(page, url):
-    safe_goto(page, url, timeout=25000)
-    page.wait_for_timeout(1000)
-    soup = soup_from_page(page)
+async def scrape_ebay(open_page, client, parse_pool, url):
+    html = await fetch_static(client, url)
+    if html is not None:
+        title, imgs = await parse_in_pool(parse_pool, parse_ebay, html)
+        if title and any(imgs):
+            return title, imgs
 
-    title, og_img = get_og_title_and_image(soup)
-    if not title and soup.title:
-        title = soup.title.string.strip()
+    async with open_page() as page:
+        await safe_goto(page, url, timeout=30000)
+        await wait_for(page, "h1.x-item-title__mainTitle, div.ux-image-carousel-item", 4000)
+        return extracted_result(await evaluate_page(page, EBAY_JS, EBAY_SELECTORS))
+
+
+# ----------------- GENERIC ----------------- #
+
+def parse_generic(tree):
+    title, og_img = get_og_title_and_image(tree)
+    if not title:
+        title = page_title(tree)
 
     imgs = [
-        img.get("src")
-        for img in soup.find_all("img")
-        if img.get("src", "").startswith("http")
+        img.attributes["src"]
+        for img in tree.css("img")
+        if (img.attributes.get("src") or "").startswith("http")
     ]
 
     if og_img:
@@ -219,89 +529,291 @@ def scrape_generic(page, url):
     return title, pad_images(imgs)
 
 
-# ----------------- MAIN RUNNER ----------------- #
+# Raw-HTML shortcut for the static path: og tags + <img src> by regex, no tree.
+# Tags written content-before-property just miss and go to the full parse.
+OG_META_RE = re.compile(
+    r'<meta[^>]+property=["\']og:(title|image)["\'][^>]+content=(["\'])(.*?)\2', re.I
+)
+IMG_SRC_RE = re.compile(r'<img\b[^>]*?\ssrc=(["\'])(http.*?)\1', re.I)
 
-def main():
-    with open(INPUT_URL_CSV, newline="", encoding="utf-8") as f:
-        url_rows = [row for row in csv.DictReader(f) if row.get("URL")]
 
-    rows_out = []
-    seen_keys = set()   # to dedupe by (source, brand, title)
+def og_from_html(html):
+    title = img = ""
+    for kind, _, value in OG_META_RE.findall(html):
+        if kind.lower() == "title" and not title:
+            title = unescape(value).strip()
+        elif kind.lower() == "image" and not img:
+            img = unescape(value).strip()
+        if title and img:
+            break
+    return title, img
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.set_default_timeout(25000)
 
-        for idx, row in enumerate(url_rows, 1):
-            url = row["URL"]
-            source = (row.get("Source") or domain_of(url)).strip()
-            brand = row.get("Brand", "").strip()
+def parse_generic_html_fast(html):
+    # None → og:title or every image missing from the regex scan, use parse_generic
+    title, og_img = og_from_html(html)
+    if not title:
+        return None
+
+    # lazy scan: pad_images stops reading after the first 4 unique URLs
+    srcs = (unescape(m.group(2)) for m in IMG_SRC_RE.finditer(html))
+    imgs = pad_images(chain([og_img], srcs))
+    if not any(imgs):
+        return None
+    return title, imgs
+
+
+GENERIC_JS = page_js("""
+const imgs = srcs().filter(s => s.startsWith('http'));
+return {title: meta(sel.og_title) || text('title'), ogImage: meta(sel.og_image), imgs};
+""")
+
+
+async def scrape_generic(open_page, client, parse_pool, url):
+    html = await fetch_static(client, url)
+    if html is not None:
+        title, imgs = (parse_generic_html_fast(html)
+                       or await parse_in_pool(parse_pool, parse_generic, html))
+        if title and any(imgs):
+            return title, imgs
+
+    async with open_page() as page:
+        await safe_goto(page, url, timeout=25000)
+        await wait_for(page, f'{OG_SELECTORS["og_image"]}, title', 3000)
+        return extracted_result(await evaluate_page(page, GENERIC_JS))
+
+
+# ----------------- CONTEXT POOL ----------------- #
+
+class ContextPool:
+    # one context per host → cookies / HTTP cache / connections stay with their site
+    def __init__(self, browser, max_pages=CONTEXT_MAX_PAGES):
+        self.browser = browser
+        self.max_pages = max_pages
+        self.slots = {}
+        self.lock = asyncio.Lock()
+
+    async def _new_slot(self):
+        ctx = await self.browser.new_context()
+        ctx.set_default_timeout(25000)
+        await ctx.route("**/*", block_heavy_resources)
+        return {"ctx": ctx, "pages": 0, "open": 0, "retired": False}
+
+    async def _slot(self, host):
+        async with self.lock:
+            slot = self.slots.get(host)
+            if slot is not None and slot["pages"] >= self.max_pages:
+                # swap in a fresh context; the old one closes once its last page does
+                slot["retired"] = True
+                if slot["open"] == 0:
+                    await slot["ctx"].close()
+                slot = None
+            if slot is None:
+                slot = self.slots[host] = await self._new_slot()
+            slot["pages"] += 1
+            slot["open"] += 1
+            return slot
+
+    @asynccontextmanager
+    async def page(self, host):
+        slot = await self._slot(host)
+        page = None
+        try:
+            # fresh page per URL → no listeners / DOM carried over between sites
+            page = await slot["ctx"].new_page()
+            yield page
+        finally:
+            if page is not None:
+                await page.close()
+            slot["open"] -= 1
+            if slot["retired"] and slot["open"] == 0:
+                await slot["ctx"].close()
 
-            print(f"[{idx}/{len(url_rows)}] {source.upper():7} {url}")
+    async def start(self):
+        for host in CONTEXT_HOSTS:
+            self.slots[host] = await self._new_slot()
 
-            try:
-                if source == "amazon":
-                    title, imgs = scrape_amazon(page, url)
-                elif source == "lazada":
-                    title, imgs = scrape_lazada(page, url)
-                elif source == "ebay":
-                    title, imgs = scrape_ebay(page, url)
-                else:
-                    title, imgs = scrape_generic(page, url)
-
-            except Exception as e:
-                print("   [ERROR scraping]", e)
-                continue
+    async def close(self):
+        for slot in self.slots.values():
+            await slot["ctx"].close()
 
-            if not any(imgs):
-                print("   [WARN] No images found → skipping")
-                continue
 
-            product_type = classify_product_type(title)
+# ----------------- MAIN RUNNER ----------------- #
 
-            # keep only Printer / Toner / Ink
-            if product_type == "Other":
-                print("   [SKIP] Not printer/toner/ink based on title.")
-                continue
+async def scrape_one(contexts, client, parse_pool, idx, row):
+    url = row["URL"]
+    source = (row.get("Source") or row["Host"]).strip()
+    brand = row.get("Brand", "").strip()
+
+    LOG.info("[%d] %-7s %s", idx, source.upper(), url)
 
-            key = (source, brand, title.strip())
-            if key in seen_keys:
-                print("   [SKIP] Duplicate product (same source/brand/title)")
+    # a browser page is only opened if the no-browser fast path falls through
+    open_page = partial(contexts.page, row["Host"])
+
+    try:
+        if source == "amazon":
+            title, imgs = await scrape_amazon(open_page, client, parse_pool, url)
+        elif source == "lazada":
+            title, imgs = await scrape_lazada(open_page, url)
+        elif source == "ebay":
+            title, imgs = await scrape_ebay(open_page, client, parse_pool, url)
+        else:
+            title, imgs = await scrape_generic(open_page, client, parse_pool, url)
+
+    except Exception as e:
+        LOG.warning("   [ERROR scraping] %s", e)
+        return
+
+    if not any(imgs):
+        LOG.warning("   [WARN] No images found → skipping")
+        return
+
+    product_type = classify_product_type(title)
+
+    # keep only Printer / Toner / Ink
+    if product_type == "Other":
+        LOG.info("   [SKIP] Not printer/toner/ink based on title.")
+        return
+
+    # one record → the three lines stay together across workers
+    LOG.info("   title: %s\n   type : %s\n   imgs : %s", title, product_type, imgs)
+
+    return {
+        "URL": url,
+        "Source": source,
+        "Brand": brand,
+        "Product_ID": f"{source}_{brand}_{idx:03d}",
+        "Product_Title": title,
+        "Product_Type": product_type,
+        "Image_URL_1": imgs[0],
+        "Image_URL_2": imgs[1],
+        "Image_URL_3": imgs[2],
+        "Image_URL_4": imgs[3],
+    }
+
+
+async def worker(contexts, client, parse_pool, queue, out_queue):
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        idx, row = item
+        await asyncio.sleep(random.uniform(0, JITTER_SECONDS))
+        out = await scrape_one(contexts, client, parse_pool, idx, row)
+        if out is not None:
+            await out_queue.put(out)
+
+
+def open_db(path):
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute(PRODUCTS_SCHEMA)
+    return con
+
+
+def already_scraped(con, url):
+    return con.execute("SELECT 1 FROM products WHERE URL = ?", (url,)).fetchone() is not None
+
+
+async def write_rows(out_queue, con):
+    # single consumer → the DB is only ever written from here
+    written = 0
+    pending = 0
+    while True:
+        row = await out_queue.get()
+        if row is None:
+            break
+        cur = con.execute(INSERT_PRODUCT, [row[k] for k in OUTPUT_FIELDS])
+        if cur.rowcount == 0:
+            LOG.info("   [SKIP] Duplicate product (same source/brand/title)")
+            continue
+        written += 1
+        pending += 1
+        if pending >= COMMIT_EVERY:
+            con.commit()
+            pending = 0
+
+    con.commit()
+    return written
+
+
+def export_csv(con, path):
+    rows = con.execute(f"SELECT {', '.join(OUTPUT_FIELDS)} FROM products ORDER BY rowid")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_FIELDS)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def read_url_rows(path):
+    # yields (idx, row); repeated URLs are dropped before anything is fetched
+    seen_urls = set()
+    idx = 0
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            url = (row.get("URL") or "").strip()
+            if not url or url in seen_urls:
                 continue
-            seen_keys.add(key)
-
-            print("   title:", title)
-            print("   type :", product_type)
-            print("   imgs :", imgs)
-
-            rows_out.append({
-                "URL": url,
-                "Source": source,
-                "Brand": brand,
-                "Product_ID": f"{source}_{brand}_{idx:03d}",
-                "Product_Title": title,
-                "Product_Type": product_type,
-                "Image_URL_1": imgs[0],
-                "Image_URL_2": imgs[1],
-                "Image_URL_3": imgs[2],
-                "Image_URL_4": imgs[3],
-            })
-
-        browser.close()
-
-    with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=[
-            "URL", "Source", "Brand", "Product_ID",
-            "Product_Title", "Product_Type",
-            "Image_URL_1", "Image_URL_2",
-            "Image_URL_3", "Image_URL_4",
-        ])
-        writer.writeheader()
-        writer.writerows(rows_out)
-
-    print(f"\n✅ Done. Saved {len(rows_out)} rows to {OUTPUT_CSV}")
+            seen_urls.add(url)
+            row["URL"] = url
+            row["Host"] = domain_of(url)   # computed once, used for routing + source
+            idx += 1
+            yield idx, row
+
+
+async def produce_rows(path, queue, con):
+    # bounded queue → at most QUEUE_SIZE rows in memory ahead of the workers
+    for idx, row in read_url_rows(path):
+        if already_scraped(con, row["URL"]):
+            continue
+        await queue.put((idx, row))
+    for _ in range(CONCURRENCY):
+        await queue.put(None)   # one stop signal per worker
+
+
+async def main():
+    queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    out_queue = asyncio.Queue()
+
+    con = open_db(OUTPUT_DB)
+    try:
+        writer_task = asyncio.create_task(write_rows(out_queue, con))
+
+        async with async_playwright() as p, \
+                httpx.AsyncClient(headers=HTTP_HEADERS, limits=HTTP_LIMITS, timeout=15,
+                                  follow_redirects=True) as client:
+            browser = await p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+            contexts = ContextPool(browser)
+            parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+            try:
+                await contexts.start()
+                await asyncio.gather(
+                    produce_rows(INPUT_URL_CSV, queue, con),
+                    *[
+                        worker(contexts, client, parse_pool, queue, out_queue)
+                        for _ in range(CONCURRENCY)
+                    ],
+                )
+            finally:
+                await contexts.close()
+                await browser.close()
+                parse_pool.shutdown()
+                await out_queue.put(None)
+                written = await writer_task
+
+        total = export_csv(con, OUTPUT_CSV)
+    finally:
+        con.close()
+
+    LOG.info("\n✅ Done. Saved %d new rows to %s, exported %d rows to %s",
+             written, OUTPUT_DB, total, OUTPUT_CSV)
 
 
 if __name__ == "__main__":
-    main()
+    atexit.register(start_logging().stop)   # flush queued records before exit
+    asyncio.run(main())